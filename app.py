@@ -19,22 +19,40 @@
 # ================================================================
 
 
-import pathlib  # For handling file paths
-import pandas as pd  # For data manipulation
+import functools  # For memoizing filter results
+import os  # For reading environment variables
+import time  # For timing debounced inputs
 import faicons as fa  # For FontAwesome icons
-import plotly.express as px  # For creating interactive visualizations
+import plotly.graph_objects as go  # For creating interactive visualizations
 from shinywidgets import render_plotly  # For rendering Plotly charts in Shiny
 from shiny import reactive, render, req  # For reactive components and rendering in Shiny
 from shiny.express import input, ui  # For creating Shiny UI components and accessing inputs
-import numpy as np  # For numerical operations like polyfit
+import numpy as np  # For numerical operations like the line of best fit
+from shared import columns, file, load_tips, split_columns  # Tips data loaded once for all sessions
 
-# File path to tips.csv (using pathlib to build the path)
-file = pathlib.Path(__file__).parent / "tips.csv"
+# tips.csv is static, so the columns shared.py built at import are used as is;
+# set TIPS_LIVE_RELOAD=1 to re-read the file reactively whenever it changes
+if os.environ.get("TIPS_LIVE_RELOAD") == "1":
+    read_file = reactive.file_reader(file)(load_tips)
 
-# Reactive file reader for CSV (this will read the CSV file reactively when needed)
-@reactive.file_reader(file)
-def read_file():
-    return pd.read_csv(file)
+    @reactive.calc
+    def tips_columns():
+        """Split the tips data into column arrays again whenever the file changes."""
+        return split_columns(read_file())
+else:
+    def tips_columns():
+        """Return the column arrays shared.py built at import."""
+        return columns
+
+# Default value of every filter, used by the sidebar and the reset button
+DEFAULTS = {
+    "total_bill": (10, 50),
+    "time": ["Lunch", "Dinner"],
+    "sex": ["Male", "Female"],
+    "smoker": ["Yes", "No"],
+    "day": ["Thur", "Fri", "Sat", "Sun"],
+    "size": (1, 6),
+}
 
 # Add page title and sidebar configuration
 ui.page_opts(title="Elias Analytics- Restauraunt Tipping Analysis", fillable=True)  # Set the title for the page and make it resizable
@@ -45,7 +63,7 @@ with ui.sidebar(open="desktop"):  # Create a sidebar that opens on desktop
         "Bill amount",
         min=10,  # Minimum value for the slider
         max=50,  # Maximum value for the slider
-        value=(10, 50),  # Initial range of the slider
+        value=DEFAULTS["total_bill"],  # Initial range of the slider
         pre="$",  # Prefix for the values displayed
     )
     # Checkbox group for selecting food service time (Lunch or Dinner)
@@ -53,27 +71,27 @@ with ui.sidebar(open="desktop"):  # Create a sidebar that opens on desktop
         "time",
         "Food service",
         ["Lunch", "Dinner"],
-        selected=["Lunch", "Dinner"],
+        selected=DEFAULTS["time"],
         inline=True,
     )
     # Checkbox group for selecting gender
     ui.input_checkbox_group(
-        "sex", "Gender", ["Male", "Female"], selected=["Male", "Female"], inline=True
+        "sex", "Gender", ["Male", "Female"], selected=DEFAULTS["sex"], inline=True
     )
     # Checkbox group for selecting smoker status
     ui.input_checkbox_group(
-        "smoker", "Smoker status", ["Yes", "No"], selected=["Yes", "No"], inline=True
+        "smoker", "Smoker status", ["Yes", "No"], selected=DEFAULTS["smoker"], inline=True
     )
     # Checkbox group for selecting the day of the week
     ui.input_checkbox_group(
         "day",
         "Day of the week",
         ["Thur", "Fri", "Sat", "Sun"],
-        selected=["Thur", "Fri", "Sat", "Sun"],
+        selected=DEFAULTS["day"],
         inline=True,
     )
     # Slider for selecting party size range
-    ui.input_slider("size", "Party Size", min=1, max=6, value=(1, 6), step=1)
+    ui.input_slider("size", "Party Size", min=1, max=6, value=DEFAULTS["size"], step=1)
     # Reset button to clear all filter selections
     ui.input_action_button("reset", "Reset filter")
 
@@ -98,9 +116,9 @@ with ui.layout_columns(fill=True):  # Layout for the content with filling
             @render.text
             def total_sales():
                 """Display the total sales count based on the filtered data"""
-                data = tips_data()  # Get the filtered data
-                if data.shape[0] > 0:  # Check if data is available after filtering
-                    return f"{data.shape[0]} sales"  # Display number of sales
+                stats = summary()  # Get the summary of the filtered data
+                if stats is not None:  # Check if data is available after filtering
+                    return f"{stats[0]} sales"  # Display number of sales
                 return "No data available"  # If no data, return this message
 
         # Nested card for displaying the average tip
@@ -110,10 +128,9 @@ with ui.layout_columns(fill=True):  # Layout for the content with filling
             @render.text
             def average_tip():
                 """Display the average tip based on the filtered data"""
-                data = tips_data()  # Get the filtered data
-                if data.shape[0] > 0:
-                    avg_tip = data["tip"].mean()  # Calculate average tip
-                    return f"${avg_tip:.2f}"  # Display the average formatted as currency
+                stats = summary()  # Get the summary of the filtered data
+                if stats is not None:
+                    return f"${stats[1]:.2f}"  # Display the average formatted as currency
                 return "No data available"  # If no data, return this message
 
         # Nested card for displaying the highest tip
@@ -123,10 +140,9 @@ with ui.layout_columns(fill=True):  # Layout for the content with filling
             @render.text
             def highest_tip():
                 """Display the highest tip based on the filtered data"""
-                data = tips_data()  # Get the filtered data
-                if data.shape[0] > 0:
-                    highest_tip = data["tip"].max()  # Find the highest tip
-                    return f"${highest_tip:.2f}"  # Display the highest tip formatted as currency
+                stats = summary()  # Get the summary of the filtered data
+                if stats is not None:
+                    return f"${stats[2]:.2f}"  # Display the highest tip formatted as currency
                 return "No data available"  # If no data, return this message
 
         # Nested card for displaying the lowest tip
@@ -136,79 +152,231 @@ with ui.layout_columns(fill=True):  # Layout for the content with filling
             @render.text
             def lowest_tip():
                 """Display the lowest tip based on the filtered data"""
-                data = tips_data()  # Get the filtered data
-                if data.shape[0] > 0:
-                    lowest_tip = data["tip"].min()  # Find the lowest tip
-                    return f"${lowest_tip:.2f}"  # Display the lowest tip formatted as currency
+                stats = summary()  # Get the summary of the filtered data
+                if stats is not None:
+                    return f"${stats[3]:.2f}"  # Display the lowest tip formatted as currency
                 return "No data available"  # If no data, return this message
 
 
 # Plot the scatter plot of total_bill vs tip with a manually added line of best fit
 @render_plotly
 def scatter_plot():
-    """Plot a scatter plot of total_bill vs tip with a manually added line of best fit."""
-    data = tips_data()  # Get the filtered data
-
-    if data.shape[0] > 0:
-        # Create scatter plot using Plotly
-        fig = px.scatter(
-            data_frame=data,
-            x="total_bill",
-            y="tip",
+    """Create the scatter plot once; update_scatter_plot fills in its traces in place."""
+    return go.FigureWidget(
+        data=[
+            # Scatter points for the filtered data, drawn with WebGL
+            go.Scattergl(
+                mode="markers",
+                showlegend=False,
+                hovertemplate="Total Bill ($)=%{x}<br>Tip ($)=%{y}<extra></extra>",
+            ),
+            # Line of best fit, colored red
+            go.Scattergl(mode="lines", name="Line of Best Fit", line=dict(color="red")),
+        ],
+        layout=dict(
             title="Total Bill vs Tip",
-            labels={"total_bill": "Total Bill ($)", "tip": "Tip ($)"},
-        )
-
-        # Add the line of best fit
-        x_vals = np.array(data["total_bill"])  # Get the total bill values
-        y_vals = np.array(data["tip"])  # Get the tip values
-
-        # Calculate the slope and intercept of the line of best fit using numpy
-        slope, intercept = np.polyfit(x_vals, y_vals, 1)  # Linear fit
-
-        # Generate points for the line of best fit
-        line_x = np.linspace(min(x_vals), max(x_vals), 100)
-        line_y = slope * line_x + intercept
-
-        # Add the line of best fit to the plot
-        fig.add_scatter(
-            x=line_x,
-            y=line_y,
-            mode="lines",
-            name="Line of Best Fit",
-            line=dict(color="red"),  # Color the line red
-        )
-
-        return fig  # Return the figure with the scatter plot and line of best fit
+            xaxis_title="Total Bill ($)",
+            yaxis_title="Tip ($)",
+        ),
+    )
+
+
+# Most points drawn in the scatter plot before it is downsampled
+MAX_PLOT_POINTS = 2000
+
+# The figure and rows the scatter plot currently shows
+plotted = {"fig": None, "rows": None}
+
+
+@reactive.effect
+def update_scatter_plot():
+    """Update the scatter plot's traces in place with the filtered data and line of best fit."""
+    fig = scatter_plot.widget  # Wait for the plot to be rendered
+    rows = tips_idx()  # Get the positions of the filtered rows
+    if plotted["fig"] is fig and np.array_equal(rows, plotted["rows"]):
+        return  # Same rows as already drawn, nothing to send
+    plotted["fig"] = fig
+    plotted["rows"] = rows
+
+    if rows.size > 0:
+        cols = tips_columns()  # Get the column arrays
+        x_vals = cols["total_bill"][rows]  # Get the total bill values
+        y_vals = cols["tip"][rows]  # Get the tip values
+        line_x, line_y = best_fit()  # Get the line of best fit
+        title = "Total Bill vs Tip"
+
+        # Draw every n-th point when there are too many; the line above still uses all of them
+        stride = -(-x_vals.size // MAX_PLOT_POINTS)  # Ceiling division
+        x_vals = x_vals[::stride]
+        y_vals = y_vals[::stride]
+        subtitle = f"Showing 1 in every {stride} sales" if stride > 1 else None
     else:
-        return px.scatter(title="No data available")  # Return a blank plot if no data
+        x_vals = y_vals = line_x = line_y = []  # Blank plot if no data
+        title = "No data available"
+        subtitle = None
+
+    # Send only the changed trace data to the browser
+    with fig.batch_update():
+        fig.data[0].x = x_vals
+        fig.data[0].y = y_vals
+        fig.data[1].x = line_x
+        fig.data[1].y = line_y
+        fig.layout.title.text = title
+        fig.layout.title.subtitle.text = subtitle
 
 
 # --------------------------------------------------------
 # Reactive calculations and effects
 # --------------------------------------------------------
 
+def selected_mask(masks, selected, window, out):
+    """Combine the precomputed row masks of the selected category values within a window into out."""
+    out.fill(False)
+    for value in selected:
+        if value in masks:  # Values missing from the data match no rows
+            np.logical_or(out, masks[value][window], out=out)
+    return out
+
+
+@reactive.calc
+def cached_filter():
+    """Build a memoized filter over the loaded data; reloading the file starts a fresh cache."""
+    cols = tips_columns()  # Get the column arrays
+    bill_arr = cols["total_bill"]
+    size_arr = cols["size"]
+
+    @functools.lru_cache(maxsize=64)
+    def filter_rows(bill, size, service_time, sex, smoker, day):
+        """Find the positions of the rows matching one hashable set of filter values."""
+        if not (service_time and sex and smoker and day):
+            rows = np.empty(0, dtype=np.intp)  # An empty checkbox group matches nothing
+        else:
+            # Filter by bill amount with a binary search, the remaining filters only see this window
+            left = np.searchsorted(bill_arr, bill[0], side="left")
+            right = np.searchsorted(bill_arr, bill[1], side="right")
+            window = slice(left, right)
+            # Every filter is written into one of two buffers and ANDed into the mask in place
+            mask = np.empty(right - left, dtype=bool)
+            scratch = np.empty_like(mask)
+            np.greater_equal(size_arr[window], size[0], out=mask)  # Filter by party size range
+            mask &= np.less_equal(size_arr[window], size[1], out=scratch)
+            mask &= selected_mask(cols["time_masks"], service_time, window, scratch)  # Filter by selected time(s)
+            mask &= selected_mask(cols["sex_masks"], sex, window, scratch)  # Filter by selected sex
+            mask &= selected_mask(cols["smoker_masks"], smoker, window, scratch)  # Filter by smoker status
+            mask &= selected_mask(cols["day_masks"], day, window, scratch)  # Filter by selected days
+            rows = left + np.flatnonzero(mask)  # Positions in increasing (bill) order
+        rows.flags.writeable = False  # Cached and shared between callers
+        return rows
+
+    return filter_rows
+
+
+def debounce(delay_secs):
+    """Hold back a calc's updates until its inputs have stopped changing for delay_secs seconds."""
+    def wrapper(f):
+        settles_at = reactive.value(None)  # When the latest change settles
+        settled = reactive.value(0)  # Bumped once a change has settled
+
+        @reactive.calc
+        def original():
+            return f()
+
+        @reactive.effect
+        @reactive.event(original, ignore_init=True)  # Only changes after the first value count
+        def note_change():
+            settles_at.set(time.monotonic() + delay_secs)
+
+        @reactive.effect
+        def wait_until_settled():
+            target = settles_at()
+            if target is None:
+                return  # Nothing pending
+            now = time.monotonic()
+            if now < target:
+                reactive.invalidate_later(target - now)  # Check again once it should have settled
+                return
+            settles_at.set(None)
+            with reactive.isolate():
+                settled.set(settled() + 1)
+
+        @reactive.calc
+        @reactive.event(settled, ignore_none=False)
+        def debounced():
+            return original()
+
+        return debounced
+
+    return wrapper
+
+
+@debounce(0.15)
+def slider_values():
+    """Read both sliders, waiting for a drag to pause before passing the values on."""
+    return tuple(input.total_bill()), tuple(input.size())
+
+
+@reactive.calc
+def tips_idx():
+    """Find the positions of the rows matching the user's filters."""
+    filter_rows = cached_filter()  # Get the memoized filter for the current data
+    bill, size = slider_values()  # Slider values (min, max) for bill amount and party size
+    return filter_rows(
+        bill,
+        size,
+        tuple(sorted(input.time())),  # Selected time(s), order does not matter
+        tuple(sorted(input.sex())),  # Selected sex
+        tuple(sorted(input.smoker())),  # Selected smoker status
+        tuple(sorted(input.day())),  # Selected days
+    )
+
 @reactive.calc
-def tips_data():
-    """Filter the tips data based on user input."""
-    tips = read_file()  # Read the data reactively
-    bill = input.total_bill()  # Get slider values (min, max) for bill amount
-    idx1 = tips["total_bill"].between(bill[0], bill[1])  # Filter by bill amount
-    idx2 = tips["time"].isin(input.time())  # Filter by selected time(s)
-    idx3 = tips["sex"].isin(input.sex())  # Filter by selected sex
-    idx4 = tips["smoker"].isin(input.smoker())  # Filter by smoker status
-    idx5 = tips["day"].isin(input.day())  # Filter by selected days
-    idx6 = tips["size"].between(input.size()[0], input.size()[1])  # Filter by party size range
-    return tips[idx1 & idx2 & idx3 & idx4 & idx5 & idx6]  # Return the filtered data
+def summary():
+    """Compute the sales count, average tip, highest tip and lowest tip of the filtered data together."""
+    cents = tips_columns()["tip_cents"][tips_idx()]  # Gather only the filtered tips, in whole cents
+    if cents.size == 0:
+        return None  # Nothing to summarize
+    count = cents.size
+    # Average in whole cents, rounding half a cent up, so ties never depend on float summation order
+    average_cents = (2 * int(cents.sum()) + count) // (2 * count)
+    return count, average_cents / 100, int(cents.max()) / 100, int(cents.min()) / 100
+
+@reactive.calc
+def best_fit():
+    """Compute the line of best fit through the filtered data."""
+    rows = tips_idx()  # Get the positions of the filtered rows
+    if rows.size == 0:
+        return None  # No line without data
+    cols = tips_columns()  # Get the column arrays
+    x_vals = cols["total_bill"][rows]  # Get the total bill values
+    y_vals = cols["tip"][rows]  # Get the tip values
+
+    # Calculate the slope and intercept of the line of best fit (closed-form least squares)
+    x_mean = x_vals.mean()
+    y_mean = y_vals.mean()
+    dx = x_vals - x_mean
+    denom = np.dot(dx, dx)
+    slope = np.dot(dx, y_vals - y_mean) / denom if denom else 0.0  # cov(x, y) / var(x)
+    intercept = y_mean - slope * x_mean
+
+    # Generate points for the line of best fit; the rows are sorted by bill, so the ends are the min and max
+    line_x = np.linspace(x_vals[0], x_vals[-1], 100)
+    line_y = slope * line_x + intercept
+    return line_x, line_y
 
 # Effect to reset all filters to their default state when the reset button is clicked
 @reactive.effect
 @reactive.event(input.reset)
 def reset_filters():
-    """Reset all filters to their default state."""
-    ui.update_slider("total_bill", value=(10, 50))  # Reset slider for total_bill
-    ui.update_checkbox_group("time", selected=["Lunch", "Dinner"])  # Reset checkbox for time
-    ui.update_checkbox_group("sex", selected=["Male", "Female"])  # Reset checkbox for sex
-    ui.update_checkbox_group("smoker", selected=["Yes", "No"])  # Reset checkbox for smoker
-    ui.update_checkbox_group("day", selected=["Thur", "Fri", "Sat", "Sun"])  # Reset checkbox for day
-    ui.update_slider("size", value=(1, 6))  # Reset slider for party size
+    """Reset all filters to their default state, skipping those already at their default."""
+    if tuple(input.total_bill()) != DEFAULTS["total_bill"]:
+        ui.update_slider("total_bill", value=DEFAULTS["total_bill"])  # Reset slider for total_bill
+    if set(input.time()) != set(DEFAULTS["time"]):
+        ui.update_checkbox_group("time", selected=DEFAULTS["time"])  # Reset checkbox for time
+    if set(input.sex()) != set(DEFAULTS["sex"]):
+        ui.update_checkbox_group("sex", selected=DEFAULTS["sex"])  # Reset checkbox for sex
+    if set(input.smoker()) != set(DEFAULTS["smoker"]):
+        ui.update_checkbox_group("smoker", selected=DEFAULTS["smoker"])  # Reset checkbox for smoker
+    if set(input.day()) != set(DEFAULTS["day"]):
+        ui.update_checkbox_group("day", selected=DEFAULTS["day"])  # Reset checkbox for day
+    if tuple(input.size()) != DEFAULTS["size"]:
+        ui.update_slider("size", value=DEFAULTS["size"])  # Reset slider for party size
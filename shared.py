@@ -0,0 +1,50 @@
+# ================================================================
+# Shared data for the Restaurant Tipping Data Analysis App
+# ================================================================
+# Shiny Express runs app.py once per session. This module is imported
+# once, so the tips data loaded here is shared by every session.
+# ================================================================
+
+
+import pathlib  # For handling file paths
+import numpy as np  # For building the column arrays
+import pandas as pd  # For data manipulation
+
+# File path to tips.csv (using pathlib to build the path)
+file = pathlib.Path(__file__).parent / "tips.csv"
+
+# Compact column types: party sizes are small, and text columns are parsed
+# straight into dictionary-encoded categoricals
+COLUMN_DTYPES = {
+    "size": "int8",
+    "sex": "category",
+    "smoker": "category",
+    "day": "category",
+    "time": "category",
+}
+
+
+def load_tips():
+    """Read the tips data from tips.csv."""
+    tips = pd.read_csv(file, dtype=COLUMN_DTYPES)
+    return tips.sort_values("total_bill", kind="stable", ignore_index=True)  # Sorted so bill ranges are contiguous
+
+
+def split_columns(tips):
+    """Split the tips data into per-column NumPy arrays and per-category row masks."""
+    cols = {
+        "total_bill": tips["total_bill"].to_numpy(),  # Bill amounts as a contiguous, sorted array
+        "tip": tips["tip"].to_numpy(),  # Tips as a contiguous array
+        "size": tips["size"].to_numpy(),  # Party sizes as a contiguous array
+        "tip_cents": np.rint(tips["tip"].to_numpy() * 100).astype(np.int64),  # Tips in whole cents
+    }
+    for name in ("time", "sex", "smoker", "day"):
+        codes = tips[name].cat.codes.to_numpy()  # Already encoded as small integer codes by load_tips
+        cols[f"{name}_masks"] = {  # Row mask for every category value
+            value: codes == code for code, value in enumerate(tips[name].cat.categories)
+        }
+    return cols
+
+
+# Read the tips data and build its column arrays once at import
+columns = split_columns(load_tips())